@@ -2,10 +2,11 @@
 import os
 import re
 import traceback
-from typing import Any, List
+from typing import Any, List, Optional, Tuple
 #Importamos pandas para procesar datos
 import pandas as pd
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 #Importamos langchain para procesar datos
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -14,6 +15,10 @@ from langchain_core.tools import tool
 import google.generativeai as genai
 #Importamos la base de datos
 from app.core.database import engine
+from app.core.settings import settings
+from app.core.jobs import Job
+from app.core.analytics import BACKEND_DUCKDB, BACKEND_POSTGRES, UnsafeQuery, get_analytics_store
+from app.core.admission import AdmissionRejected, PRIORITY_INTERACTIVE, get_admission
 #Importamos el router de fastapi
 router = APIRouter(tags=["ask"])
 
@@ -183,127 +188,217 @@ class AskRequest(BaseModel):
     prompt: str
 
 
-# Endpoint /ask 
-
-@router.post("/ask")
-async def ask_ai(request: AskRequest):
-    try:
-        print(f"DEBUG: Procesando solicitud (Single-Pass): {request.prompt}", flush=True)
-        
-        my_llm = get_llm()
-        my_db = get_db_langchain()
-        
-        # Cargar el manual una sola vez para meterlo en el prompt (ahorra 1 request por consulta)
-        manual_content = "No disponible."
-        if os.path.exists("manual_usuario.md"):
-            with open("manual_usuario.md", "r") as f:
-                manual_content = f.read()
-
-        system_message = f"""Eres un Asistente de BI Inteligente experto en ventas y políticas de empresa.
-        
-        REGLAS:
-        1. Si la pregunta requiere datos, genera una única consulta SQL válida para PostgreSQL.
-        2. Si la pregunta es sobre políticas o el manual, usa la información de abajo.
-        3. Devuelve SIEMPRE una respuesta textual amigable.
-        
-        INFORMACIÓN DEL MANUAL DE USUARIO:
-        {manual_content}
-        
-        ESQUEMA DE BASE DE DATOS:
-        Tablas: {my_db.get_usable_table_names()}
-        {custom_system_message}
-        
-        FORMATO DE SALIDA ESTRICTO:
-        1. PRIMERO: Tu respuesta textual.
-           - Si la pregunta NO tiene sentido o NO está relacionada con Ventas, Productos, Vendedores o el Manual, responde EXACTAMENTE así: "¡Hola! No he podido comprender tu mensaje. Soy un asistente de BI especializado y puedo ayudarte con consultas sobre Ventas, Vendedores, Productos, Categorías o el Manual de Usuario. ¿En qué puedo apoyarte hoy?"
-        2. SEGUNDO: El bloque SQL.
-           - Si la pregunta requiere datos numéricos: GENERA EL BLOQUE SQL COMPLETO.
-           - Si la pregunta es sobre el manual o políticas (texto puro): NO ESCRIBAS NADA MÁS. NO PONGAS ```sql ``` VACÍOS.
-
-        Estructura obligatoria:
-        [Tu respuesta en texto aquí...]
-        
-        ```sql
-        (SOLO SI ES NECESARIO, SI NO, NO PONGAS ESTE BLOQUE)
-        SELECT ...
-        ```
-        """
-        # Mensaje que le enviamos a la ia
-        messages = [
-            ("system", system_message),
-            ("user", request.prompt)
-        ]
-
-        print("DEBUG: Invocando LLM (Llamada única)...", flush=True)
+# Ejecutar el SQL en PostgreSQL; si hay un job asociado, registrar la conexión para poder cancelarla
+def execute_sql_postgres(sql_query: str, job: Optional[Job] = None) -> pd.DataFrame:
+    if job is None:
+        return pd.read_sql(sql_query, engine)
+    with engine.connect() as conn:
+        job.attach_connection(conn.connection.dbapi_connection)
+        try:
+            return pd.read_sql(sql_query, conn)
+        finally:
+            job.detach_connection()
+
+
+# Ejecutar el SQL generado: snapshot DuckDB por defecto (si está activo), PostgreSQL para datos en vivo.
+# Solo el camino de PostgreSQL ocupa slots del limitador SQL (protege su pool de conexiones)
+def execute_sql(
+    sql_query: str,
+    job: Optional[Job] = None,
+    prompt: str = "",
+    priority: int = PRIORITY_INTERACTIVE,
+    admission_timeout: Optional[float] = None,
+) -> Tuple[pd.DataFrame, str]:
+    store = get_analytics_store()
+    if store is not None and store.choose_backend(prompt, sql_query) == BACKEND_DUCKDB:
+        try:
+            return store.query(sql_query, job), BACKEND_DUCKDB
+        except UnsafeQuery:
+            # Lo que no es una única SELECT tampoco debe llegar a PostgreSQL
+            raise
+        except Exception as e:
+            if job is not None:
+                job.check_cancelled()
+            # Diferencias de dialecto u otros fallos: se reintenta en PostgreSQL
+            print(f"DEBUG: Fallback a PostgreSQL ({e})", flush=True)
+    with get_admission().sql.slot(priority, admission_timeout, job):
+        return execute_sql_postgres(sql_query, job), BACKEND_POSTGRES
+
+
+# Pipeline completo pregunta -> LLM -> SQL -> datos (compartido por /ask y /jobs)
+
+def run_ask_pipeline(
+    prompt: str,
+    job: Optional[Job] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    admission_timeout: Optional[float] = None,
+) -> dict:
+    print(f"DEBUG: Procesando solicitud (Single-Pass): {prompt}", flush=True)
+    
+    my_llm = get_llm()
+    my_db = get_db_langchain()
+    
+    # Cargar el manual una sola vez para meterlo en el prompt (ahorra 1 request por consulta)
+    manual_content = "No disponible."
+    if os.path.exists("manual_usuario.md"):
+        with open("manual_usuario.md", "r") as f:
+            manual_content = f.read()
+
+    # Con el snapshot DuckDB activo, el mismo SQL debe valer en ambos motores
+    sql_dialect_rule = ""
+    if get_analytics_store() is not None:
+        sql_dialect_rule = (
+            "4. El SQL debe ser portable entre PostgreSQL y DuckDB: usa EXTRACT, DATE_TRUNC y CAST; "
+            "evita funciones exclusivas de PostgreSQL como TO_CHAR, AGE o GENERATE_SERIES."
+        )
+
+    system_message = f"""Eres un Asistente de BI Inteligente experto en ventas y políticas de empresa.
+    
+    REGLAS:
+    1. Si la pregunta requiere datos, genera una única consulta SQL válida para PostgreSQL.
+    2. Si la pregunta es sobre políticas o el manual, usa la información de abajo.
+    3. Devuelve SIEMPRE una respuesta textual amigable.
+    {sql_dialect_rule}
+    
+    INFORMACIÓN DEL MANUAL DE USUARIO:
+    {manual_content}
+    
+    ESQUEMA DE BASE DE DATOS:
+    Tablas: {my_db.get_usable_table_names()}
+    {custom_system_message}
+    
+    FORMATO DE SALIDA ESTRICTO:
+    1. PRIMERO: Tu respuesta textual.
+       - Si la pregunta NO tiene sentido o NO está relacionada con Ventas, Productos, Vendedores o el Manual, responde EXACTAMENTE así: "¡Hola! No he podido comprender tu mensaje. Soy un asistente de BI especializado y puedo ayudarte con consultas sobre Ventas, Vendedores, Productos, Categorías o el Manual de Usuario. ¿En qué puedo apoyarte hoy?"
+    2. SEGUNDO: El bloque SQL.
+       - Si la pregunta requiere datos numéricos: GENERA EL BLOQUE SQL COMPLETO.
+       - Si la pregunta es sobre el manual o políticas (texto puro): NO ESCRIBAS NADA MÁS. NO PONGAS ```sql ``` VACÍOS.
+
+    Estructura obligatoria:
+    [Tu respuesta en texto aquí...]
+    
+    ```sql
+    (SOLO SI ES NECESARIO, SI NO, NO PONGAS ESTE BLOQUE)
+    SELECT ...
+    ```
+    """
+    # Mensaje que le enviamos a la ia
+    messages = [
+        ("system", system_message),
+        ("user", prompt)
+    ]
+
+    if job is not None:
+        job.check_cancelled()
+    print("DEBUG: Invocando LLM (Llamada única)...", flush=True)
+    # Cada etapa (LLM y luego SQL) tiene su propio plazo de espera en la cola
+    with get_admission().llm.slot(priority, admission_timeout, job):
         response = my_llm.invoke(messages)
+    
+    # Función de limpieza robusta para Gemini
+    def clean_all(text):
+        if not text: return ""
+        t = str(text).strip()
+        if "signature" in t or "extras" in t or t.startswith("[{"):
+            try:
+                import ast
+                p = ast.literal_eval(t)
+                if isinstance(p, list) and len(p) > 0: return clean_all(p[0].get("text", str(p[0])))
+                if isinstance(p, dict): return clean_all(p.get("text", str(p)))
+            except:
+                import re
+                m = re.search(r"['\"]text['\"]:\s*['\"](.*?)['\"](?:,\s*['\"]extras['\"])?", t, re.DOTALL)
+                if m: return m.group(1).replace("\\n", "\n").replace("\\'", "'")
+        return t
+
+    res_text = clean_all(response.content)
+    data = []
+    backend = None
+    
+    # Extraer SQL más flexible (con o sin etiqueta 'sql')
+    import re
+    sql_match = re.search(r"```(?:sql)?\s*(SELECT.*?)```", res_text, re.DOTALL | re.IGNORECASE)
+    if sql_match:
+        sql_query = sql_match.group(1).strip()
+        # Limpiar el texto para que el usuario no vea el código SQL crudo (opcional)
+        res_text = res_text.replace(sql_match.group(0), "").strip()
         
-        # Función de limpieza robusta para Gemini
-        def clean_all(text):
-            if not text: return ""
-            t = str(text).strip()
-            if "signature" in t or "extras" in t or t.startswith("[{"):
-                try:
-                    import ast
-                    p = ast.literal_eval(t)
-                    if isinstance(p, list) and len(p) > 0: return clean_all(p[0].get("text", str(p[0])))
-                    if isinstance(p, dict): return clean_all(p.get("text", str(p)))
-                except:
-                    import re
-                    m = re.search(r"['\"]text['\"]:\s*['\"](.*?)['\"](?:,\s*['\"]extras['\"])?", t, re.DOTALL)
-                    if m: return m.group(1).replace("\\n", "\n").replace("\\'", "'")
-            return t
-
-        res_text = clean_all(response.content)
-        data = []
+        if job is not None:
+            job.check_cancelled()
+        print(f"DEBUG: Ejecutando SQL extraído: {sql_query}", flush=True)
+        try:
+            df, backend = execute_sql(sql_query, job, prompt, priority, admission_timeout)
+            data = process_data_with_pandas(df.to_dict(orient='records'))
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            print(f"ERROR SQL: {e}", flush=True)
+            data = [{"error": str(e)}]
+
+    # Generar sugerencia de gráfico más inteligente
+    suggestion = "bar"
+    if data:
+        keys = [k.lower() for k in data[0].keys()]
+        p = prompt.lower()
         
-        # Extraer SQL más flexible (con o sin etiqueta 'sql')
-        import re
-        sql_match = re.search(r"```(?:sql)?\s*(SELECT.*?)```", res_text, re.DOTALL | re.IGNORECASE)
-        if sql_match:
-            sql_query = sql_match.group(1).strip()
-            # Limpiar el texto para que el usuario no vea el código SQL crudo (opcional)
-            res_text = res_text.replace(sql_match.group(0), "").strip()
-            
-            print(f"DEBUG: Ejecutando SQL extraído: {sql_query}", flush=True)
-            try:
-                df = pd.read_sql(sql_query, engine)
-                data = process_data_with_pandas(df.to_dict(orient='records'))
-            except Exception as e:
-                print(f"ERROR SQL: {e}", flush=True)
-                data = [{"error": str(e)}]
-
-        # Generar sugerencia de gráfico más inteligente
-        suggestion = "bar"
-        if data:
-            keys = [k.lower() for k in data[0].keys()]
-            p = request.prompt.lower()
-            
-            # Prioridad 1: Detección por prompt
-            if any(w in p for w in ["porcentaje", "distribucion", "proporcion", "circular", "pastel", "pie"]):
-                suggestion = "arc"
-            elif any(w in p for w in ["relación", "frente a", "vs", "dispersión"]):
-                suggestion = "point"
-            # Prioridad 2: Detección por datos
-            elif any(any(w in k for w in ["fecha", "tiempo", "mes", "año", "date", "time"]) for k in keys):
-                suggestion = "line"
-            elif len(data) > 10:
-                suggestion = "bar"
-
-        # Respuesta final
-        if not res_text and data:
-            res_text = f"He encontrado {len(data)} registros para tu consulta."
-        elif not res_text:
-            res_text = "No he podido encontrar una respuesta clara. ¿Me das más detalles?"
+        # Prioridad 1: Detección por prompt
+        if any(w in p for w in ["porcentaje", "distribucion", "proporcion", "circular", "pastel", "pie"]):
+            suggestion = "arc"
+        elif any(w in p for w in ["relación", "frente a", "vs", "dispersión"]):
+            suggestion = "point"
+        # Prioridad 2: Detección por datos
+        elif any(any(w in k for w in ["fecha", "tiempo", "mes", "año", "date", "time"]) for k in keys):
+            suggestion = "line"
+        elif len(data) > 10:
+            suggestion = "bar"
+
+    # Respuesta final
+    if not res_text and data:
+        res_text = f"He encontrado {len(data)} registros para tu consulta."
+    elif not res_text:
+        res_text = "No he podido encontrar una respuesta clara. ¿Me das más detalles?"
+
+    return {
+        "metadata": {"question": prompt, "suggested_chart": suggestion, "backend": backend},
+        "data": data,
+        "answer": res_text,
+        "status": "success"
+    }
+
+
+# Convertir un rechazo de admisión en una respuesta HTTP rápida con Retry-After
+def admission_http_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code,
+        detail=e.reason,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+# Rate limit por cliente (la IP real la envía Nginx en X-Real-IP)
+def check_rate_limit(http_request: Request) -> None:
+    client = http_request.headers.get("x-real-ip") or (http_request.client.host if http_request.client else "anon")
+    try:
+        get_admission().rate_limiter.check(client)
+    except AdmissionRejected as e:
+        raise admission_http_error(e)
 
-        return {
-            "metadata": {"question": request.prompt, "suggested_chart": suggestion},
-            "data": data,
-            "answer": res_text,
-            "status": "success"
-        }
+
+# Endpoint /ask 
+
+@router.post("/ask")
+async def ask_ai(request: AskRequest, http_request: Request):
+    try:
+        check_rate_limit(http_request)
+        # El pipeline es bloqueante (LLM + SQL): se ejecuta fuera del event loop
+        return await run_in_threadpool(
+            run_ask_pipeline, request.prompt, None, PRIORITY_INTERACTIVE, settings.admission_ask_deadline_seconds
+        )
     # Manejo de errores
     except HTTPException as he:
         raise he
+    except AdmissionRejected as e:
+        raise admission_http_error(e)
     except Exception as e:
         print(f"ERROR CRÍTICO EN /ASK: {e}", flush=True)
         traceback.print_exc()
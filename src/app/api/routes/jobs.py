@@ -0,0 +1,105 @@
+"""Endpoints /jobs: envío asíncrono de preguntas, consulta de estado y cancelación."""
+
+# Importar librerías
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+# Importar pipeline y gestor de trabajos
+from app.api.routes.ask import AskRequest, check_rate_limit, run_ask_pipeline
+from app.core.admission import PRIORITY_BACKGROUND
+from app.core.jobs import FINAL_STATES, Job, JobManager, JobManagerStopped, JobQueueFull
+from app.core.settings import settings
+
+router = APIRouter(tags=["jobs"])
+
+# Variable global (se inicializa al primer uso, igual que el LLM)
+job_manager = None
+
+
+# Los trabajos ceden el paso a /ask en las colas de LLM y SQL, pero toleran más espera
+def run_job(prompt: str, job: Job) -> dict:
+    return run_ask_pipeline(prompt, job, PRIORITY_BACKGROUND, settings.admission_job_deadline_seconds)
+
+
+def get_job_manager() -> JobManager:
+    global job_manager
+    if job_manager is None:
+        job_manager = JobManager(
+            run_job,
+            max_workers=settings.jobs_max_workers,
+            queue_size=settings.jobs_queue_size,
+            result_ttl=settings.jobs_result_ttl_seconds,
+        )
+        job_manager.start()
+    return job_manager
+
+
+def shutdown_job_manager():
+    """Detiene los workers al apagar la aplicación."""
+    if job_manager is not None:
+        job_manager.shutdown(wait=False)
+
+
+def _get_job_or_404(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+    return job
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(request: AskRequest, http_request: Request):
+    """Encola la pregunta y devuelve el id del trabajo inmediatamente."""
+    check_rate_limit(http_request)
+    try:
+        job = get_job_manager().submit(request.prompt)
+    except JobQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Demasiados trabajos en cola, inténtalo más tarde",
+            headers={"Retry-After": "5"},
+        )
+    except JobManagerStopped:
+        raise HTTPException(status_code=503, detail="El servicio se está apagando, inténtalo más tarde")
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Devuelve el estado del trabajo y, si terminó, su resultado."""
+    return _get_job_or_404(job_id).to_dict()
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancela el trabajo (y la sentencia SQL en curso, si la hay)."""
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Stream SSE con cada cambio de estado hasta que el trabajo finaliza."""
+    job = _get_job_or_404(job_id)
+
+    async def event_stream():
+        last_status = None
+        while True:
+            if job.status != last_status:
+                last_status = job.status
+                yield f"event: status\ndata: {json.dumps(job.to_dict(), default=str)}\n\n"
+            if last_status in FINAL_STATES:
+                return
+            await asyncio.sleep(0.5)
+
+    # X-Accel-Buffering evita que Nginx acumule el stream antes de enviarlo
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
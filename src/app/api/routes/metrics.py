@@ -0,0 +1,21 @@
+"""Endpoint /metrics: control de admisión, cola de trabajos y snapshot analítico."""
+
+from fastapi import APIRouter
+
+from app.api.routes import jobs
+from app.core.admission import get_admission
+from app.core.analytics import get_analytics_store
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def metrics():
+    """Devuelve profundidad de colas, slots en uso y peticiones rechazadas."""
+    manager = jobs.job_manager
+    store = get_analytics_store()
+    return {
+        "admission": get_admission().stats(),
+        "jobs": {"queue_depth": manager.queue_depth() if manager is not None else 0},
+        "analytics": store.stats() if store is not None else {"enabled": False},
+    }
@@ -0,0 +1,115 @@
+"""Benchmark: consultas de BI en PostgreSQL vs snapshot DuckDB sobre datos del seed escalados.
+
+Uso (¡contra una base de datos desechable, el script inserta ventas!):
+
+    python -m app.benchmark --scale 20 --repeat 5
+"""
+
+# Importar librerías
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+# Importar base de datos y modelos
+from app.core.database import engine, SessionLocal
+from app import models
+from app.core.analytics import AnalyticsStore
+from app.seed import populate_db
+
+
+# Consultas representativas (las mismas que se dan de ejemplo al LLM y alguna más pesada)
+QUERIES = {
+    "top_vendedores": """
+        SELECT vd.nombre AS vendedor, SUM(vt.total) AS total_ventas
+        FROM ventas vt JOIN vendedores vd ON vt.id_vendedor = vd.id_vendedor
+        GROUP BY vd.nombre ORDER BY total_ventas DESC LIMIT 10
+    """,
+    "ventas_por_categoria": """
+        SELECT c.nombre AS categoria, SUM(vt.total) AS total_ventas
+        FROM ventas vt JOIN productos p ON vt.id_producto = p.id_producto
+        JOIN categorias c ON p.id_categoria = c.id_categoria
+        GROUP BY c.nombre ORDER BY total_ventas DESC LIMIT 100
+    """,
+    "ventas_por_region": """
+        SELECT vd.region AS region, SUM(vt.total) AS total_ventas
+        FROM ventas vt JOIN vendedores vd ON vt.id_vendedor = vd.id_vendedor
+        GROUP BY vd.region ORDER BY total_ventas DESC LIMIT 100
+    """,
+    "ventas_mensuales_por_producto": """
+        SELECT p.nombre AS producto, EXTRACT(YEAR FROM vt.fecha_venta) AS anio,
+               EXTRACT(MONTH FROM vt.fecha_venta) AS mes,
+               SUM(vt.total) AS total_ventas, AVG(vt.cantidad) AS promedio_cantidad
+        FROM ventas vt JOIN productos p ON vt.id_producto = p.id_producto
+        JOIN estados_venta e ON vt.id_estado = e.id_estado
+        WHERE e.nombre = 'Completado'
+        GROUP BY p.nombre, anio, mes ORDER BY anio, mes, total_ventas DESC
+    """,
+}
+
+
+# Escalar la tabla de hechos duplicando las ventas del seed hasta llegar a N veces
+def scale_sales(scale: int) -> int:
+    with engine.begin() as conn:
+        base = conn.execute(text("SELECT COUNT(*) FROM ventas")).scalar()
+        target = base * scale
+        current = base
+        while current < target:
+            conn.execute(
+                text(
+                    "INSERT INTO ventas (id_usuario, id_vendedor, id_producto, id_estado, total, cantidad, fecha_venta) "
+                    "SELECT id_usuario, id_vendedor, id_producto, id_estado, total, cantidad, fecha_venta "
+                    "FROM ventas ORDER BY id_venta LIMIT :n"
+                ),
+                {"n": min(current, target - current)},
+            )
+            current = conn.execute(text("SELECT COUNT(*) FROM ventas")).scalar()
+    return current
+
+
+def time_query(run, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run_benchmark(scale: int, repeat: int) -> None:
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        is_empty = db.query(models.Categoria).count() == 0
+    finally:
+        db.close()
+    if is_empty:
+        populate_db()
+
+    rows = scale_sales(scale) if scale > 1 else None
+    print(f"Ventas en PostgreSQL: {rows or 'sin escalar'}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnalyticsStore(os.path.join(tmp, "benchmark.duckdb"))
+        start = time.perf_counter()
+        store.refresh(full=True)
+        print(f"Snapshot DuckDB completo: {time.perf_counter() - start:.2f}s")
+
+        print(f"{'consulta':<32}{'postgres (s)':>14}{'duckdb (s)':>14}{'speedup':>10}")
+        for name, sql_query in QUERIES.items():
+            pg = time_query(lambda: pd.read_sql(sql_query, engine), repeat)
+            duck = time_query(lambda: store.query(sql_query), repeat)
+            print(f"{name:<32}{pg:>14.4f}{duck:>14.4f}{pg / duck:>9.1f}x")
+
+
+# Ejecutar el script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=10, help="Multiplicador de las ventas del seed")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por consulta (se toma la mediana)")
+    args = parser.parse_args()
+    run_benchmark(args.scale, args.repeat)
@@ -0,0 +1,262 @@
+"""Control de admisión: límites de concurrencia (LLM / SQL) y rate limit por cliente.
+
+Ante un pico de tráfico es preferible rechazar rápido (429/503 con
+Retry-After) que dejar que todas las peticiones esperen hasta el timeout.
+"""
+
+# Importar librerías
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Importar gestor de trabajos (para abortar esperas de jobs cancelados)
+from app.core.jobs import Job
+
+
+# Prioridades: menor número = se atiende antes
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class AdmissionRejected(Exception):
+    """Petición rechazada por falta de capacidad o por exceder el rate limit."""
+
+    def __init__(self, reason: str, status_code: int = 503, retry_after: int = 1):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """Semáforo con cola de prioridad acotada y rechazo según deadline.
+
+    Como máximo ``limit`` operaciones se ejecutan a la vez; hasta ``max_queue``
+    esperan turno. Una petición se rechaza si la cola está llena, si su
+    deadline vence esperando o si la espera estimada ya no cabe en el deadline.
+    Solo cuentan los que esperan por delante (misma prioridad o mejor): con la
+    cola llena, una petición prioritaria desaloja al último de menor prioridad.
+    """
+
+    # Cada cuánto se revisa si el job asociado a una espera fue cancelado
+    CANCEL_POLL_SECONDS = 0.5
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._avg_duration = 0.0
+        self._admitted = 0
+        self._evicted: set = set()
+        self._shed: Dict[str, int] = {"queue_full": 0, "deadline": 0, "evicted": 0, "cancelled": 0}
+        self._max_queue_depth = 0
+
+    # -- Estimaciones --
+
+    def _estimated_wait(self, position: int) -> float:
+        # Tiempo medio de servicio por cada "ronda" de slots que hay delante
+        return self._avg_duration * math.ceil(position / self.limit)
+
+    def _ahead_of(self, priority: int) -> int:
+        return sum(1 for p, _ in self._waiters if p <= priority)
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._estimated_wait(len(self._waiters) + 1)))
+
+    def _remove(self, ticket: tuple) -> None:
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self._shed[reason] += 1
+        return AdmissionRejected(f"Capacidad de {self.name} agotada ({reason})", 503, self._retry_after())
+
+    # -- Adquisición --
+
+    def acquire(
+        self,
+        priority: int = PRIORITY_INTERACTIVE,
+        deadline: Optional[float] = None,
+        job: Optional[Job] = None,
+    ) -> None:
+        """Reserva un slot; ``deadline`` es un instante de ``time.monotonic()``.
+
+        Si se pasa ``job``, la espera se aborta con ``JobCancelled`` al cancelarlo.
+        """
+        with self._cond:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                self._admitted += 1
+                return
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._estimated_wait(self._ahead_of(priority) + 1) > remaining:
+                    raise self._reject("deadline")
+            if len(self._waiters) >= self.max_queue:
+                # Desalojar al último de menor prioridad; si no lo hay, rechazar al que llega
+                victim = max(self._waiters) if self._waiters else None
+                if victim is None or victim[0] <= priority:
+                    raise self._reject("queue_full")
+                self._evicted.add(victim)
+                self._remove(victim)
+
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            self._max_queue_depth = max(self._max_queue_depth, len(self._waiters))
+            while True:
+                # Primero el desalojo: el ticket ya no está en la cola (que puede estar vacía)
+                if ticket in self._evicted:
+                    self._evicted.discard(ticket)
+                    raise self._reject("evicted")
+                if self._waiters and self._waiters[0] == ticket and self._in_flight < self.limit:
+                    heapq.heappop(self._waiters)
+                    self._in_flight += 1
+                    self._admitted += 1
+                    # Puede quedar otro slot libre para el siguiente en la cola
+                    self._cond.notify_all()
+                    return
+                if job is not None and job.cancelled:
+                    self._remove(ticket)
+                    self._shed["cancelled"] += 1
+                    job.check_cancelled()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._remove(ticket)
+                    raise self._reject("deadline")
+                if job is not None:
+                    remaining = self.CANCEL_POLL_SECONDS if remaining is None else min(remaining, self.CANCEL_POLL_SECONDS)
+                self._cond.wait(remaining)
+
+    def release(self, duration: float) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            # Media móvil exponencial del tiempo de servicio
+            if self._avg_duration == 0.0:
+                self._avg_duration = duration
+            else:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None, job: Optional[Job] = None):
+        """Ejecuta el bloque con un slot reservado; ``timeout`` acota solo la espera en esta cola."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.acquire(priority, deadline, job)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "max_queue_depth": self._max_queue_depth,
+                "avg_duration_seconds": round(self._avg_duration, 3),
+                "admitted": self._admitted,
+                "shed": dict(self._shed),
+            }
+
+
+class TokenBucket:
+    """Token bucket clásico: ``rate`` tokens por segundo, hasta ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """Consume un token; devuelve 0 si hubo, o los segundos hasta el próximo."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class ClientRateLimiter:
+    """Un ``TokenBucket`` por cliente. ``rate_per_minute <= 0`` lo desactiva."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_clients: int = 10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._rejected = 0
+
+    def check(self, client: str) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._evict_full_buckets()
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            wait = bucket.try_acquire()
+            if wait > 0:
+                self._rejected += 1
+                raise AdmissionRejected("Demasiadas peticiones, inténtalo más tarde", 429, max(1, math.ceil(wait)))
+
+    def _evict_full_buckets(self) -> None:
+        # Un bucket lleno equivale a uno nuevo: se puede descartar sin efecto
+        now = time.monotonic()
+        idle = [
+            client for client, b in self._buckets.items()
+            if b.tokens + (now - b.updated) * b.rate >= b.capacity
+        ]
+        for client in idle:
+            del self._buckets[client]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"clients": len(self._buckets), "rejected": self._rejected}
+
+
+class AdmissionController:
+    """Agrupa los limitadores que protegen al pipeline de /ask."""
+
+    def __init__(self, llm: ConcurrencyLimiter, sql: ConcurrencyLimiter, rate_limiter: ClientRateLimiter):
+        self.llm = llm
+        self.sql = sql
+        self.rate_limiter = rate_limiter
+
+    def stats(self) -> dict:
+        return {
+            "llm": self.llm.stats(),
+            "sql": self.sql.stats(),
+            "rate_limit": self.rate_limiter.stats(),
+        }
+
+
+# Variable global (se inicializa al primer uso)
+admission = None
+
+
+def get_admission() -> AdmissionController:
+    global admission
+    if admission is None:
+        from app.core.settings import settings
+        admission = AdmissionController(
+            llm=ConcurrencyLimiter("LLM", settings.admission_llm_concurrency, settings.admission_queue_size),
+            sql=ConcurrencyLimiter("SQL", settings.admission_sql_concurrency, settings.admission_queue_size),
+            rate_limiter=ClientRateLimiter(settings.admission_rate_per_minute, settings.admission_burst),
+        )
+    return admission
@@ -0,0 +1,315 @@
+"""Backend analítico opcional: snapshot columnar (DuckDB) del esquema estrella.
+
+Las agregaciones de BI se ejecutan por defecto sobre una copia local en
+DuckDB en lugar de las tablas OLTP de PostgreSQL. La copia se refresca
+periódicamente: las dimensiones se recargan completas (son pequeñas) y
+``ventas`` se importa de forma incremental por la marca de agua ``id_venta``,
+releyendo además una ventana de filas por debajo de ella (secuencias que
+confirman fuera de orden, cambios recientes de ``id_estado``). Lo que quede
+fuera de la ventana se recoge en la reconstrucción completa periódica, por
+eso la antigüedad del snapshot se mide desde la última reconstrucción.
+
+Requiere el extra ``analytics`` (``pip install .[analytics]``).
+"""
+
+# Importar librerías
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import pandas as pd
+from sqlalchemy import Integer, Numeric, String, DateTime, text
+
+# Importar base de datos y modelos
+from app.core.database import Base, engine
+from app.core.settings import settings
+from app import models  # noqa: F401  (registra las tablas en Base.metadata)
+
+# Backends posibles para una consulta
+BACKEND_DUCKDB = "duckdb"
+BACKEND_POSTGRES = "postgres"
+
+FACT_TABLE = "ventas"
+FACT_KEY = "id_venta"
+DIMENSION_TABLES = [
+    "categorias", "tipos_usuario", "tipos_vendedor", "estados_venta",
+    "productos", "usuarios", "vendedores",
+]
+
+# Preguntas que piden datos "en vivo" se responden siempre desde PostgreSQL
+FRESHNESS_PROMPT_RE = re.compile(
+    r"\b(hoy|ahora|actual(?:es|mente)?|tiempo real|en este momento|[uú]ltim[ao]s? (?:hora|minuto)s?)\b",
+    re.IGNORECASE,
+)
+FRESHNESS_SQL_RE = re.compile(r"\b(now\s*\(|current_date|current_timestamp|localtimestamp)", re.IGNORECASE)
+
+
+class UnsafeQuery(ValueError):
+    """La consulta no es una única sentencia SELECT; no se ejecuta en ningún backend."""
+
+
+def duckdb_type(column) -> str:
+    """Traduce el tipo SQLAlchemy de una columna a su equivalente en DuckDB."""
+    col_type = column.type
+    if isinstance(col_type, Integer):
+        return "INTEGER"
+    if isinstance(col_type, Numeric):
+        return f"DECIMAL({col_type.precision or 18}, {col_type.scale or 2})"
+    if isinstance(col_type, DateTime):
+        return "TIMESTAMP"
+    if isinstance(col_type, String):
+        return "VARCHAR"
+    return "VARCHAR"
+
+
+def is_freshness_critical(prompt: str, sql_query: str) -> bool:
+    return bool(FRESHNESS_PROMPT_RE.search(prompt or "") or FRESHNESS_SQL_RE.search(sql_query or ""))
+
+
+class AnalyticsStore:
+    """Snapshot DuckDB de ``ventas`` y sus dimensiones."""
+
+    def __init__(
+        self,
+        path: str,
+        source_engine: Any = engine,
+        refresh_seconds: float = 300.0,
+        full_refresh_seconds: float = 600.0,
+        max_staleness_seconds: float = 900.0,
+        lookback_rows: int = 5000,
+        chunk_size: int = 50000,
+    ):
+        import duckdb
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.source_engine = source_engine
+        self.refresh_seconds = refresh_seconds
+        self.full_refresh_seconds = full_refresh_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        self.lookback_rows = lookback_rows
+        self.chunk_size = chunk_size
+        # El SQL lo genera el LLM: sin acceso a ficheros ni red (read_text, ATTACH, COPY...)
+        # y con la configuración bloqueada para que no se pueda reactivar desde SQL.
+        # integer_division: "/" entre enteros trunca como en PostgreSQL (7/2 = 3, no 3.5)
+        self._con = duckdb.connect(path, config={
+            "enable_external_access": False,
+            "integer_division": True,
+            "lock_configuration": True,
+        })
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_refresh: Optional[float] = None
+        self.last_full_refresh: Optional[float] = None
+        self._create_tables()
+
+    # -- Esquema --
+
+    def _create_tables(self) -> None:
+        cur = self._con.cursor()
+        for name in DIMENSION_TABLES + [FACT_TABLE]:
+            table = Base.metadata.tables[name]
+            cols = ", ".join(f"{c.name} {duckdb_type(c)}" for c in table.columns)
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {name} ({cols})")
+        cur.close()
+
+    def _load(self, cur, name: str, df: pd.DataFrame) -> int:
+        if df.empty:
+            return 0
+        cols = ", ".join(df.columns)
+        cur.register("_chunk", df)
+        try:
+            cur.execute(f"INSERT INTO {name} ({cols}) SELECT {cols} FROM _chunk")
+        finally:
+            cur.unregister("_chunk")
+        return len(df)
+
+    # -- Refresco --
+
+    def watermark(self) -> int:
+        cur = self._con.cursor()
+        try:
+            return cur.execute(f"SELECT COALESCE(MAX({FACT_KEY}), 0) FROM {FACT_TABLE}").fetchone()[0]
+        finally:
+            cur.close()
+
+    def refresh(self, full: bool = False) -> int:
+        """Sincroniza el snapshot con PostgreSQL; devuelve las filas de ventas cargadas."""
+        with self._refresh_lock:
+            # Idempotente: recupera el esquema si alguna tabla desapareció
+            self._create_tables()
+            local_mark = 0 if full else self.watermark()
+            with self.source_engine.connect() as src:
+                source_mark = src.execute(text(f"SELECT COALESCE(MAX({FACT_KEY}), 0) FROM {FACT_TABLE}")).scalar()
+                # Si la fuente "retrocedió" (ej. re-seed) la copia ya no es válida
+                if source_mark < local_mark:
+                    full, local_mark = True, 0
+
+                cur = self._con.cursor()
+                cur.execute("BEGIN TRANSACTION")
+                try:
+                    for name in DIMENSION_TABLES:
+                        cur.execute(f"DELETE FROM {name}")
+                        self._load(cur, name, pd.read_sql(text(f"SELECT * FROM {name}"), src))
+                    # Se recarga todo lo que está por encima de la ventana (o la tabla entera si es full)
+                    lower = 0 if full else max(0, local_mark - self.lookback_rows)
+                    cur.execute(f"DELETE FROM {FACT_TABLE} WHERE {FACT_KEY} > ?", [lower])
+                    imported = 0
+                    # stream_results evita traer toda la tabla de hechos a memoria de golpe
+                    chunks = pd.read_sql(
+                        text(
+                            f"SELECT * FROM {FACT_TABLE} WHERE {FACT_KEY} > :mark "
+                            f"AND {FACT_KEY} <= :upper ORDER BY {FACT_KEY}"
+                        ),
+                        src.execution_options(stream_results=True),
+                        params={"mark": lower, "upper": source_mark},
+                        chunksize=self.chunk_size,
+                    )
+                    for chunk in chunks:
+                        imported += self._load(cur, FACT_TABLE, chunk)
+                    cur.execute("COMMIT")
+                except Exception:
+                    cur.execute("ROLLBACK")
+                    raise
+                finally:
+                    cur.close()
+
+            now = time.time()
+            self.last_refresh = now
+            # Partir de un snapshot vacío equivale a una reconstrucción completa
+            if full or local_mark == 0:
+                self.last_full_refresh = now
+            print(f"DEBUG: Snapshot analítico actualizado ({imported} ventas cargadas, full={full})", flush=True)
+            return imported
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                due_full = (
+                    self.last_full_refresh is None
+                    or time.time() - self.last_full_refresh >= self.full_refresh_seconds
+                )
+                self.refresh(full=due_full)
+            except Exception as e:
+                print(f"ERROR refrescando snapshot analítico: {e}", flush=True)
+            self._stop.wait(self.refresh_seconds)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name="analytics-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def close(self, timeout: float = 10.0) -> bool:
+        """Detiene el refresco y cierra el fichero DuckDB; False si el hilo no terminó a tiempo."""
+        self.stop()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Cerrar la conexión con un refresco a medias lo haría fallar; es daemon y muere con el proceso
+                return False
+        self._con.close()
+        return True
+
+    # -- Consultas --
+
+    @property
+    def ready(self) -> bool:
+        # Un fichero de una ejecución anterior no sirve hasta reconstruirlo al menos una vez
+        return self.last_full_refresh is not None
+
+    def staleness(self) -> Optional[float]:
+        """Antigüedad garantizada: las filas fuera de la ventana solo se actualizan en el refresco completo."""
+        return None if self.last_full_refresh is None else time.time() - self.last_full_refresh
+
+    def stats(self) -> dict:
+        staleness = self.staleness()
+        return {
+            "ready": self.ready,
+            "watermark": self.watermark(),
+            "staleness_seconds": None if staleness is None else round(staleness, 1),
+            "last_refresh": self.last_refresh,
+            "last_full_refresh": self.last_full_refresh,
+        }
+
+    def choose_backend(self, prompt: str, sql_query: str) -> str:
+        """Decide si la consulta puede servirse desde el snapshot."""
+        if not self.ready or self.staleness() > self.max_staleness_seconds:
+            return BACKEND_POSTGRES
+        if is_freshness_critical(prompt, sql_query):
+            return BACKEND_POSTGRES
+        return BACKEND_DUCKDB
+
+    def validate(self, sql_query: str) -> None:
+        """Solo se admite una única sentencia SELECT (nada de DDL/DML ni PRAGMA)."""
+        import duckdb
+
+        # Un error de sintaxis se propaga tal cual para que se reintente en PostgreSQL
+        statements = duckdb.extract_statements(sql_query)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise UnsafeQuery("Solo se permite una única consulta SELECT")
+
+    def query(self, sql_query: str, job: Any = None) -> pd.DataFrame:
+        self.validate(sql_query)
+        cur = self._con.cursor()
+        if job is not None:
+            # Cancelar un job interrumpe la consulta en DuckDB igual que en PostgreSQL
+            job.attach_connection(SimpleNamespace(cancel=cur.interrupt))
+        try:
+            return cur.execute(sql_query).df()
+        finally:
+            if job is not None:
+                job.detach_connection()
+            cur.close()
+
+
+# Variable global (se inicializa al primer uso; None si está desactivado)
+analytics_store = None
+_analytics_checked = False
+_analytics_lock = threading.Lock()
+
+
+def get_analytics_store() -> Optional[AnalyticsStore]:
+    global analytics_store, _analytics_checked
+    with _analytics_lock:
+        if _analytics_checked:
+            return analytics_store
+        _analytics_checked = True
+        if settings.analytics_enabled:
+            try:
+                analytics_store = AnalyticsStore(
+                    settings.analytics_path,
+                    refresh_seconds=settings.analytics_refresh_seconds,
+                    full_refresh_seconds=settings.analytics_full_refresh_seconds,
+                    max_staleness_seconds=settings.analytics_max_staleness_seconds,
+                    lookback_rows=settings.analytics_refresh_lookback_rows,
+                )
+                if settings.analytics_full_refresh_seconds >= settings.analytics_max_staleness_seconds:
+                    print(
+                        "ADVERTENCIA: APP_ANALYTICS_FULL_REFRESH_SECONDS >= APP_ANALYTICS_MAX_STALENESS_SECONDS; "
+                        "el snapshot se considerará obsoleto entre reconstrucciones",
+                        flush=True,
+                    )
+                analytics_store.start()
+                print(f"Backend analítico DuckDB activo en {settings.analytics_path}", flush=True)
+            except ImportError:
+                print("ADVERTENCIA: APP_ANALYTICS_ENABLED=True pero duckdb no está instalado", flush=True)
+            except Exception as e:
+                print(f"ERROR iniciando backend analítico: {e}", flush=True)
+    return analytics_store
+
+
+def shutdown_analytics_store():
+    """Detiene el refresco, espera al hilo y libera el fichero DuckDB al apagar la aplicación."""
+    global analytics_store, _analytics_checked
+    with _analytics_lock:
+        store, analytics_store, _analytics_checked = analytics_store, None, False
+    if store is not None and not store.close():
+        print("ADVERTENCIA: el refresco analítico no terminó a tiempo; se deja abierto el snapshot", flush=True)
@@ -0,0 +1,282 @@
+"""Modo asíncrono: cola acotada de trabajos y pool de workers en proceso.
+
+Cada pregunta enviada a /jobs se convierte en un ``Job`` que espera en una
+cola de tamaño fijo hasta que uno de los workers la ejecuta. Así la
+concurrencia HTTP queda desacoplada de la concurrencia de consultas.
+"""
+
+# Importar librerías
+import queue
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+
+# Estados posibles de un trabajo
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINAL_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """La cola de trabajos está llena; el cliente debe reintentar más tarde."""
+
+
+class JobManagerStopped(Exception):
+    """El gestor ya se está apagando y no acepta trabajos nuevos."""
+
+
+class JobCancelled(Exception):
+    """Se lanza dentro del pipeline cuando el trabajo fue cancelado."""
+
+
+class Job:
+    """Estado de una pregunta en ejecución asíncrona."""
+
+    def __init__(self, prompt: str):
+        self.id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.status = JOB_QUEUED
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._dbapi_connection: Any = None
+
+    # -- Cancelación --
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self) -> None:
+        """Punto de control del pipeline: aborta si se pidió cancelar."""
+        if self.cancelled:
+            raise JobCancelled(self.id)
+
+    def attach_connection(self, dbapi_connection: Any) -> None:
+        """Registra la conexión DBAPI que ejecuta el SQL para poder cancelarlo."""
+        with self._lock:
+            self._dbapi_connection = dbapi_connection
+        # Si la cancelación llegó antes de conectar, abortar ya
+        if self.cancelled:
+            self._cancel_statement()
+
+    def detach_connection(self) -> None:
+        with self._lock:
+            self._dbapi_connection = None
+
+    def request_cancel(self) -> None:
+        self._cancel_event.set()
+        self._cancel_statement()
+
+    def _cancel_statement(self) -> None:
+        # psycopg2 expone connection.cancel() para abortar la sentencia en curso
+        with self._lock:
+            conn = self._dbapi_connection
+        cancel = getattr(conn, "cancel", None)
+        if cancel is not None:
+            try:
+                cancel()
+            except Exception as e:
+                print(f"ERROR cancelando sentencia del job {self.id}: {e}", flush=True)
+
+    # -- Serialización --
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "question": self.prompt,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Pool acotado de workers que consume una cola de ``Job``.
+
+    ``runner`` recibe ``(prompt, job)`` y devuelve el diccionario de respuesta.
+    Los resultados se conservan ``result_ttl`` segundos tras finalizar.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[str, Job], dict],
+        max_workers: int = 4,
+        queue_size: int = 100,
+        result_ttl: float = 600.0,
+    ):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.result_ttl = result_ttl
+        # La cola no tiene límite propio: la capacidad se mide con ``_pending``,
+        # que solo cuenta trabajos vivos (los cancelados en cola no ocupan hueco)
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._pending = 0
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._workers: list = []
+        self._started = False
+        self._stopping = False
+
+    def start(self) -> None:
+        with self._lock:
+            # Tras shutdown() el pool no se vuelve a arrancar
+            if self._started or self._stopping:
+                return
+            for i in range(self.max_workers):
+                t = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._workers.append(t)
+            self._started = True
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cancela lo pendiente y detiene los workers."""
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            self._stopping = True
+            jobs = list(self._jobs.values())
+        # Vaciar la cola: lo que no llegó a ejecutarse se cancela directamente
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                self._cancel_queued(job)
+            self._queue.task_done()
+        for job in jobs:
+            if job.status not in FINAL_STATES:
+                job.request_cancel()
+        for _ in self._workers:
+            self._queue.put_nowait(None)
+        if wait:
+            for t in self._workers:
+                t.join()
+        self._workers = []
+
+    # -- API pública --
+
+    def submit(self, prompt: str) -> Job:
+        if self._stopping:
+            raise JobManagerStopped("El servicio de trabajos se está apagando")
+        self.start()
+        self.purge_expired()
+        job = Job(prompt)
+        with self._lock:
+            if self._stopping:
+                raise JobManagerStopped("El servicio de trabajos se está apagando")
+            if self._pending >= self.queue_size:
+                raise JobQueueFull("La cola de trabajos está llena")
+            self._pending += 1
+            self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status in FINAL_STATES:
+            return job
+        job.request_cancel()
+        # Un trabajo aún en cola se marca ya como cancelado y libera su hueco; el worker lo saltará
+        self._cancel_queued(job)
+        return job
+
+    def queue_depth(self) -> int:
+        """Trabajos vivos esperando un worker."""
+        with self._lock:
+            return self._pending
+
+    def purge_expired(self) -> None:
+        """Elimina los trabajos finalizados cuya retención ya expiró."""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and now - job.finished_at > self.result_ttl
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    # -- Workers --
+
+    def _finish(self, job: Job, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+
+    def _leave_queue(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _cancel_queued(self, job: Job) -> None:
+        with job._lock:
+            if job.status == JOB_QUEUED:
+                self._finish(job, JOB_CANCELLED)
+                self._leave_queue()
+
+    def _worker_loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None or self._stopping:
+                    if job is not None:
+                        self._cancel_queued(job)
+                    return
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Job) -> None:
+        with job._lock:
+            if job.status != JOB_QUEUED:
+                return
+            self._leave_queue()
+            if job.cancelled:
+                self._finish(job, JOB_CANCELLED)
+                return
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+
+        try:
+            result = self.runner(job.prompt, job)
+        except JobCancelled:
+            self._finish(job, JOB_CANCELLED)
+            return
+        except Exception as e:
+            print(f"ERROR en job {job.id}: {e}", flush=True)
+            traceback.print_exc()
+            self._finish(job, JOB_CANCELLED if job.cancelled else JOB_FAILED, error=str(e))
+            return
+        finally:
+            job.detach_connection()
+
+        # Si se canceló durante el SQL el pipeline devuelve un error de datos: no es un éxito
+        if job.cancelled:
+            self._finish(job, JOB_CANCELLED)
+        else:
+            self._finish(job, JOB_SUCCEEDED, result=result)
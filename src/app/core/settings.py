@@ -15,6 +15,28 @@ class Settings(BaseSettings):
     # Configuración de Google Gemini
     google_api_key: str = ""
 
+    # Modo asíncrono (/jobs): pool de workers, tamaño de cola y retención de resultados
+    jobs_max_workers: int = 4
+    jobs_queue_size: int = 100
+    jobs_result_ttl_seconds: int = 600
+
+    # Control de admisión: concurrencia de LLM y SQL, cola de espera y rate limit por cliente
+    admission_llm_concurrency: int = 4
+    admission_sql_concurrency: int = 8
+    admission_queue_size: int = 20
+    admission_ask_deadline_seconds: float = 30.0
+    admission_job_deadline_seconds: float = 240.0
+    admission_rate_per_minute: float = 30.0
+    admission_burst: int = 10
+
+    # Backend analítico opcional (DuckDB): snapshot columnar de ventas y dimensiones
+    analytics_enabled: bool = False
+    analytics_path: str = "data/analytics.duckdb"
+    analytics_refresh_seconds: int = 300
+    analytics_full_refresh_seconds: int = 600
+    analytics_refresh_lookback_rows: int = 5000
+    analytics_max_staleness_seconds: int = 900
+
     # Configuración de Pydantic Settings
     model_config = SettingsConfigDict(env_prefix="APP_", env_file=".env", extra="ignore", case_sensitive=False)
 
@@ -1,13 +1,26 @@
 # Importar librerías
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 # Importar rutas
-from app.api.routes import health, root, ask
+from app.api.routes import health, root, ask, jobs, metrics
 from app.core.database import engine
 from app import models
 from app.core.settings import settings
+from app.core.analytics import get_analytics_store, shutdown_analytics_store
+
+# Ciclo de vida: arrancar el refresco analítico y detener los hilos de fondo
+# (workers de jobs y refresco analítico) al apagar
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Backend analítico opcional: arranca el refresco del snapshot DuckDB en segundo plano
+    get_analytics_store()
+    yield
+    jobs.shutdown_job_manager()
+    shutdown_analytics_store()
+
 
 # Crear la aplicación FastAPI
 def create_app() -> FastAPI:
@@ -47,6 +60,7 @@ def create_app() -> FastAPI:
         description="Microservicio de BI con Exploración de Datos Interactiva GenBI",
         version="0.1.0",
         debug=settings.app_debug,
+        lifespan=lifespan,
     )
 
     # CORS (permisos para que el front pueda comunicarse con el back)
@@ -62,6 +76,8 @@ def create_app() -> FastAPI:
     app.include_router(health.router)
     app.include_router(root.router)
     app.include_router(ask.router)
+    app.include_router(jobs.router)
+    app.include_router(metrics.router)
 
     return app
 
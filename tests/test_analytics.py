@@ -0,0 +1,250 @@
+"""Tests del snapshot analítico DuckDB (fuente SQLite en lugar de PostgreSQL)."""
+
+import os
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+# Asegurar DATABASE_URL para que el import de la base de datos no falle en CI/tests
+os.environ.setdefault("APP_DATABASE_URL", "sqlite:///test.db")
+
+pytest.importorskip("duckdb")
+
+from sqlalchemy import create_engine, text
+
+from app import models
+from app.core.analytics import BACKEND_DUCKDB, BACKEND_POSTGRES, AnalyticsStore, UnsafeQuery
+
+
+@pytest.fixture
+def source(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    models.Base.metadata.create_all(bind=eng)
+    with eng.begin() as conn:
+        conn.execute(text("INSERT INTO categorias (id_categoria, nombre) VALUES (1, 'Oficina')"))
+        conn.execute(text("INSERT INTO productos (id_producto, nombre, precio, stock, id_categoria) VALUES (1, 'Silla', 10.50, 5, 1)"))
+        for i in range(1, 4):
+            conn.execute(text(f"INSERT INTO ventas (id_venta, id_producto, total, cantidad) VALUES ({i}, 1, 10.50, 1)"))
+    return eng
+
+
+def add_sale(eng, id_venta):
+    with eng.begin() as conn:
+        conn.execute(text(f"INSERT INTO ventas (id_venta, id_producto, total, cantidad) VALUES ({id_venta}, 1, 21.00, 2)"))
+
+
+def test_incremental_refresh_by_watermark(source, tmp_path):
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source, lookback_rows=0)
+    assert store.refresh() == 3
+    add_sale(source, 4)
+    assert store.refresh() == 1
+    assert store.watermark() == 4
+
+    df = store.query(
+        "SELECT c.nombre AS categoria, SUM(vt.total) AS total_ventas FROM ventas vt "
+        "JOIN productos p ON vt.id_producto = p.id_producto "
+        "JOIN categorias c ON p.id_categoria = c.id_categoria GROUP BY c.nombre"
+    )
+    assert float(df["total_ventas"][0]) == pytest.approx(52.50)
+
+
+def test_incremental_refresh_rereads_lookback_window(source, tmp_path):
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source, lookback_rows=2)
+    with source.begin() as conn:
+        conn.execute(text("DELETE FROM ventas WHERE id_venta = 2"))
+    store.refresh()
+    # Venta 2 confirmada tarde (por debajo de la marca) y cambio de estado de la venta 3
+    add_sale(source, 2)
+    with source.begin() as conn:
+        conn.execute(text("UPDATE ventas SET id_estado = 7 WHERE id_venta = 3"))
+    assert store.refresh() == 2
+    df = store.query("SELECT id_venta, id_estado FROM ventas ORDER BY id_venta")
+    assert df["id_venta"].tolist() == [1, 2, 3]
+    assert int(df["id_estado"][2]) == 7
+
+
+def test_snapshot_is_stale_without_recent_full_refresh(source, tmp_path):
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source, max_staleness_seconds=60)
+    store.refresh()
+    sql = "SELECT COUNT(*) FROM ventas"
+    assert store.choose_backend("ventas", sql) == BACKEND_DUCKDB
+    # Los incrementales no bastan: lo que queda fuera de la ventana solo llega con el completo
+    store.last_full_refresh -= 120
+    store.refresh()
+    assert store.choose_backend("ventas", sql) == BACKEND_POSTGRES
+    store.refresh(full=True)
+    assert store.choose_backend("ventas", sql) == BACKEND_DUCKDB
+
+
+def test_full_refresh_when_source_is_reseeded(source, tmp_path):
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source)
+    store.refresh()
+    with source.begin() as conn:
+        conn.execute(text("DELETE FROM ventas WHERE id_venta > 1"))
+    assert store.refresh() == 1
+    assert store.watermark() == 1
+
+
+def test_close_joins_refresh_thread_and_closes_connection(source, tmp_path):
+    import duckdb
+
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source, refresh_seconds=0.05)
+    store.start()
+    for _ in range(200):
+        if store.ready:
+            break
+        time.sleep(0.01)
+    assert store.close()
+    assert not store._thread.is_alive()
+    with pytest.raises(duckdb.ConnectionException):
+        store.watermark()
+
+
+def test_freshness_critical_queries_go_to_postgres(source, tmp_path):
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source)
+    sql = "SELECT id_estado, COUNT(*) FROM ventas GROUP BY id_estado"
+    # Sin snapshot todavía no se puede servir desde DuckDB
+    assert store.choose_backend("ventas por estado", sql) == BACKEND_POSTGRES
+    store.refresh()
+    assert store.choose_backend("ventas por estado", sql) == BACKEND_DUCKDB
+    assert store.choose_backend("ventas de hoy", sql) == BACKEND_POSTGRES
+    assert store.choose_backend("ventas", sql + " WHERE fecha_venta > NOW()") == BACKEND_POSTGRES
+
+
+# -- Enrutado de consultas en /ask --
+
+@pytest.fixture
+def ask():
+    pytest.importorskip("langchain_google_genai")
+    from app.api.routes import ask as ask_module
+    return ask_module
+
+
+@pytest.fixture
+def postgres_calls(ask, monkeypatch):
+    """Sustituye la ejecución en PostgreSQL y registra las consultas recibidas."""
+    calls = []
+
+    def fake_postgres(sql_query, job=None):
+        calls.append(sql_query)
+        return pd.DataFrame([{"a": 1}])
+
+    monkeypatch.setattr(ask, "execute_sql_postgres", fake_postgres)
+    return calls
+
+
+class FailingStore:
+    def choose_backend(self, prompt, sql_query):
+        return BACKEND_DUCKDB
+
+    def query(self, sql_query, job=None):
+        raise RuntimeError("dialecto no soportado")
+
+
+def test_execute_sql_without_store_uses_postgres(ask, postgres_calls, monkeypatch):
+    monkeypatch.setattr(ask, "get_analytics_store", lambda: None)
+    df, backend = ask.execute_sql("SELECT 1 AS a")
+    assert backend == BACKEND_POSTGRES
+    assert df.to_dict(orient="records") == [{"a": 1}]
+
+
+def test_execute_sql_falls_back_when_duckdb_fails(ask, postgres_calls, monkeypatch):
+    monkeypatch.setattr(ask, "get_analytics_store", lambda: FailingStore())
+    _, backend = ask.execute_sql("SELECT 1 AS a", prompt="ventas por región")
+    assert backend == BACKEND_POSTGRES
+    assert postgres_calls == ["SELECT 1 AS a"]
+
+
+def test_execute_sql_routes_by_freshness(ask, postgres_calls, monkeypatch, source, tmp_path):
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source)
+    store.refresh()
+    monkeypatch.setattr(ask, "get_analytics_store", lambda: store)
+    sql_limiter = ask.get_admission().sql
+    admitted = sql_limiter.stats()["admitted"]
+
+    df, backend = ask.execute_sql("SELECT COUNT(*) AS n FROM ventas", prompt="ventas totales")
+    assert backend == BACKEND_DUCKDB
+    assert int(df["n"][0]) == 3
+    # Las lecturas en DuckDB no ocupan slots del limitador de PostgreSQL
+    assert sql_limiter.stats()["admitted"] == admitted
+
+    _, backend = ask.execute_sql("SELECT COUNT(*) AS n FROM ventas", prompt="ventas de hoy")
+    assert backend == BACKEND_POSTGRES
+    assert sql_limiter.stats()["admitted"] == admitted + 1
+
+
+def test_pipeline_reports_backend_in_metadata(ask, postgres_calls, monkeypatch):
+    class FakeLLM:
+        def invoke(self, messages):
+            return SimpleNamespace(content="Aquí tienes.\n```sql\nSELECT 1 AS a\n```")
+
+    class FakeDB:
+        def get_usable_table_names(self):
+            return ["ventas"]
+
+    monkeypatch.setattr(ask, "get_llm", lambda: FakeLLM())
+    monkeypatch.setattr(ask, "get_db_langchain", lambda: FakeDB())
+    monkeypatch.setattr(ask, "get_analytics_store", lambda: None)
+    result = ask.run_ask_pipeline("ventas por región")
+    assert result["metadata"]["backend"] == BACKEND_POSTGRES
+    assert result["data"] == [{"a": 1}]
+
+
+def test_query_rejects_non_select_and_file_access(source, tmp_path):
+    import duckdb
+
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source)
+    store.refresh()
+    with pytest.raises(UnsafeQuery):
+        store.query("SELECT 1; DROP TABLE ventas; SELECT 2")
+    with pytest.raises(UnsafeQuery):
+        store.query("DROP TABLE ventas")
+    with pytest.raises(duckdb.Error):
+        store.query("SELECT content FROM read_text('/etc/hostname')")
+    with pytest.raises(duckdb.Error):
+        store.query("SELECT * FROM read_csv('/etc/passwd')")
+    # El snapshot sigue intacto y refrescable
+    assert store.refresh() >= 0
+    assert store.watermark() == 3
+
+
+def test_execute_sql_does_not_fall_back_on_unsafe_sql(ask, postgres_calls, monkeypatch, source, tmp_path):
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source)
+    store.refresh()
+    monkeypatch.setattr(ask, "get_analytics_store", lambda: store)
+    with pytest.raises(UnsafeQuery):
+        ask.execute_sql("SELECT 1; DROP TABLE ventas", prompt="ventas")
+    assert postgres_calls == []
+
+
+# Consultas válidas en ambos motores cuya semántica difiere entre DuckDB y PostgreSQL por defecto
+PORTABILITY_QUERIES = [
+    "SELECT 7/2 AS r",
+    "SELECT SUM(cantidad)/COUNT(*) AS media_entera FROM ventas",
+    "SELECT id_producto, SUM(cantidad) AS unidades, SUM(total) AS total_ventas, AVG(cantidad) AS promedio "
+    "FROM ventas GROUP BY id_producto ORDER BY id_producto",
+    "SELECT c.nombre AS categoria, SUM(vt.total) / COUNT(*) AS ticket_medio FROM ventas vt "
+    "JOIN productos p ON vt.id_producto = p.id_producto "
+    "JOIN categorias c ON p.id_categoria = c.id_categoria GROUP BY c.nombre",
+]
+
+
+@pytest.mark.parametrize("sql_query", PORTABILITY_QUERIES)
+def test_duckdb_matches_source_results(source, tmp_path, sql_query):
+    # La fuente SQLite, como PostgreSQL, trunca la división entera
+    with source.begin() as conn:
+        conn.execute(text("INSERT INTO ventas (id_venta, id_producto, total, cantidad) VALUES (4, 1, 42.00, 4)"))
+    store = AnalyticsStore(str(tmp_path / "snap.duckdb"), source)
+    store.refresh()
+
+    expected = pd.read_sql(text(sql_query), source)
+    actual = store.query(sql_query)
+    assert list(actual.columns) == list(expected.columns)
+    for col in expected.columns:
+        for a, e in zip(actual[col], expected[col]):
+            if isinstance(e, str):
+                assert a == e
+            else:
+                assert float(a) == pytest.approx(float(e))
@@ -0,0 +1,124 @@
+"""Tests del gestor de trabajos asíncronos (sin LLM ni base de datos)."""
+
+import threading
+import time
+
+import pytest
+
+from app.core.jobs import (
+    JOB_CANCELLED,
+    JOB_FAILED,
+    JOB_SUCCEEDED,
+    JobManager,
+    JobManagerStopped,
+    JobQueueFull,
+)
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_job_runs_and_stores_result():
+    manager = JobManager(lambda prompt, job: {"answer": prompt.upper()}, max_workers=1)
+    job = manager.submit("hola")
+    assert wait_for(lambda: job.status == JOB_SUCCEEDED)
+    assert manager.get(job.id).result == {"answer": "HOLA"}
+    manager.shutdown()
+
+
+def test_failed_job_records_error():
+    def runner(prompt, job):
+        raise ValueError("boom")
+
+    manager = JobManager(runner, max_workers=1)
+    job = manager.submit("x")
+    assert wait_for(lambda: job.status == JOB_FAILED)
+    assert job.error == "boom"
+    manager.shutdown()
+
+
+def test_queue_full_is_rejected():
+    release = threading.Event()
+    manager = JobManager(lambda prompt, job: release.wait(), max_workers=1, queue_size=1)
+    running = manager.submit("a")
+    assert wait_for(lambda: running.started_at is not None)
+    manager.submit("b")
+    with pytest.raises(JobQueueFull):
+        manager.submit("c")
+    release.set()
+    manager.shutdown()
+
+
+def test_cancel_running_job_calls_connection_cancel():
+    cancelled = threading.Event()
+
+    class FakeConnection:
+        def cancel(self):
+            cancelled.set()
+
+    def runner(prompt, job):
+        job.attach_connection(FakeConnection())
+        cancelled.wait(2)
+        job.check_cancelled()
+
+    manager = JobManager(runner, max_workers=1)
+    job = manager.submit("lenta")
+    assert wait_for(lambda: job.started_at is not None)
+    manager.cancel(job.id)
+    assert wait_for(lambda: job.status == JOB_CANCELLED)
+    assert cancelled.is_set()
+    manager.shutdown()
+
+
+def test_finished_jobs_expire():
+    manager = JobManager(lambda prompt, job: {}, max_workers=1, result_ttl=0)
+    job = manager.submit("x")
+    assert wait_for(lambda: job.status == JOB_SUCCEEDED)
+    time.sleep(0.01)
+    assert manager.get(job.id) is None
+    manager.shutdown()
+
+
+def test_cancelled_queued_jobs_free_capacity():
+    release = threading.Event()
+    manager = JobManager(lambda prompt, job: release.wait(), max_workers=1, queue_size=1)
+    running = manager.submit("a")
+    assert wait_for(lambda: running.started_at is not None)
+    queued = manager.submit("b")
+    manager.cancel(queued.id)
+    assert queued.status == JOB_CANCELLED
+    # El hueco del cancelado queda libre aunque siga físicamente en la cola
+    manager.submit("c")
+    assert manager.queue_depth() == 1
+    release.set()
+    manager.shutdown()
+
+
+def test_shutdown_does_not_block_on_busy_workers():
+    release = threading.Event()
+    manager = JobManager(lambda prompt, job: release.wait(), max_workers=1, queue_size=2)
+    running = manager.submit("a")
+    assert wait_for(lambda: running.started_at is not None)
+    pending = [manager.submit("b"), manager.submit("c")]
+
+    done = threading.Event()
+    threading.Thread(target=lambda: (manager.shutdown(wait=False), done.set()), daemon=True).start()
+    assert done.wait(2)
+    assert all(job.status == JOB_CANCELLED for job in pending)
+    release.set()
+
+
+def test_submit_after_shutdown_is_rejected():
+    manager = JobManager(lambda prompt, job: {}, max_workers=1)
+    manager.submit("x")
+    manager.shutdown()
+    with pytest.raises(JobManagerStopped):
+        manager.submit("y")
+    # No se arranca un pool nuevo por la puerta de atrás
+    assert manager._workers == []